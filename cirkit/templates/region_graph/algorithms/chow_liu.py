@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 import torch
 from scipy import sparse as sp
@@ -16,6 +18,8 @@ def ChowLiuTree(
     num_categories: int | None = None,
     num_bins: int | None = None,
     as_region_graph: bool = True,
+    block_size: int | None = None,
+    num_neighbors: int | None = None,
 ) -> np.ndarray | RegionGraph:
     """Learns a Chow-Liu Tree and returns it either as a
     list of predecessors (Bayesian net) or as region graph (HCLT).
@@ -32,16 +36,31 @@ def ChowLiuTree(
         num_categories (int | None): Specifies the number of categories in case of
             categorical data.
         num_bins (int | None): In case of categorical input, it is used to rescale
-            categories in bins for ordinal features, e.g. [0, 255] -> [0, 7],
-            which is useful for images.
+            categories in at most num_bins bins of equal width for ordinal features,
+            e.g. [0, 255] -> [0, 7], which is useful for images. If None and there are more
+            than 32 categories, either specified or inferred from the data, then the categories
+            are rescaled in at most 8 bins, i.e. the categories are assumed to be ordinal by
+            default. To disable the rescaling, e.g. for nominal features, it can be set to the
+            number of categories.
         as_region_graph (Optional[bool]): True to returns a region graph,
             False to return a list of predecessors. Defaults to True.
+        block_size (int | None): In case of categorical input, the number of rows of the mutual
+            information matrix computed at once, useful to bound the memory in case of many
+            features or categories. If None, then the rows are split in 8 blocks.
+        num_neighbors (int | None): If not None, the spanning tree is searched within the sparse
+            graph of the num_neighbors heaviest edges of every variable, which is faster and
+            lighter in case of many features. Note that the resulting tree is an approximation,
+            i.e. it may not be the Chow-Liu tree, as the edges outside such graph are never
+            considered. If such graph is not connected, then the spanning tree is searched
+            within the dense graph. Defaults to None.
 
     Returns:
         A Chow-Liu Tree, either a list of predecessors or as a region graph.
 
     Raises:
         ValueError: If the number of categories has not been specified but the number of bins has.
+        ValueError: If the chunk size or the block size is not positive.
+        ValueError: If the number of neighbors is not positive.
         NotImplementedError: If the input type is neither 'categorical' nor 'gaussian'.
     """
     assert data.ndim == 2
@@ -50,27 +69,38 @@ def ChowLiuTree(
         is_categorical_mask = [name == "categorical" for name in input_type]
         mutual_info = _heterogeneous_mutual_info(data, is_categorical_mask=is_categorical_mask)
     elif input_type == "categorical":
+        data = data.long()
+        if num_bins is None:
+            if num_categories is None:
+                num_categories = int(data.max().item() + 1)
+            if num_categories > 32:
+                num_bins = 8
         if num_bins is not None:
             if num_categories is None:
                 raise ValueError("Number of categories must be known if rescaling in bins")
-            data = torch.div(data, num_categories // num_bins, rounding_mode="floor")
+            bin_width = math.ceil(num_categories / num_bins)
+            data = data // bin_width
+            num_categories = (num_categories - 1) // bin_width + 1
         mutual_info = _categorical_mutual_info(
-            data.long(), num_categories=num_categories, chunk_size=chunk_size
+            data,
+            num_categories=num_categories,
+            chunk_size=chunk_size,
+            block_size=block_size,
         )
     elif input_type == "gaussian":
         # todo: implement chunked computation
-        mutual_info = -0.5 * torch.log(1 - torch.corrcoef(data.t()) ** 2)
+        mutual_info = _gaussian_mutual_info(data)
     else:
         raise NotImplementedError(f"MI computation not implemented for {input_type} input units")
 
-    _, tree = _maximum_spanning_tree(adj_matrix=mutual_info, root=root)
+    _, tree = _maximum_spanning_tree(adj_matrix=mutual_info, root=root, num_neighbors=num_neighbors)
     if as_region_graph:
         return tree2rg(tree)
     return tree
 
 
 def _maximum_spanning_tree(
-    adj_matrix: Tensor, root: int | None = None
+    adj_matrix: Tensor, root: int | None = None, num_neighbors: int | None = None
 ) -> tuple[np.ndarray, np.ndarray]:
     """Runs the maximum spanning tree of a given adjacency matrix rooted at a given variable.
 
@@ -78,17 +108,39 @@ def _maximum_spanning_tree(
         adj_matrix (Tensor): The adjacency matrix.
         root (int | None): The index of the variable desired as root.
             If None, picks the one that minimizes depth.
+        num_neighbors (int | None): If not None, the spanning tree is first searched within
+            the sparse graph of the num_neighbors heaviest edges of every node, and within
+            the dense graph only if the sparse one is not connected. In the former case, the
+            spanning tree may not be the maximum one.
 
     Returns:
-        bfs: The BFS order of the spanning tree.
+        order: The nodes of the spanning tree, such that each node comes after its parent.
         tree: The spanning tree in form of list of predecessors.
+
+    Raises:
+        ValueError: If the number of neighbors is not positive.
     """
-    mst = sp.csgraph.minimum_spanning_tree(-(adj_matrix.cpu().numpy() + 1.0), overwrite=True)
+    if num_neighbors is not None and num_neighbors < 1:
+        raise ValueError(f"The number of neighbors must be positive, but found {num_neighbors}")
+    num_nodes = adj_matrix.shape[0]
+    mst = None
+    if num_neighbors is not None and num_neighbors < num_nodes - 1:
+        mst = _knn_maximum_spanning_tree(adj_matrix, num_neighbors)
+    if mst is None:
+        adj = adj_matrix.to("cpu", copy=True)
+        rows, cols = _boruvka_maximum_spanning_tree(adj.numpy())
+        mst = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(num_nodes, num_nodes))
     if root is None:
-        dist_from_all_nodes = sp.csgraph.dijkstra(
-            abs(mst).todense(), directed=False, return_predecessors=False
+        # The root minimizing the depth is the center of the tree, i.e. the middle node of a
+        # longest path, whose endpoints are found by two BFSes as the last visited nodes
+        bfs = sp.csgraph.breadth_first_order(mst, 0, directed=False, return_predecessors=False)
+        bfs, tree = sp.csgraph.breadth_first_order(
+            mst, directed=False, i_start=bfs[-1], return_predecessors=True
         )
-        root = np.argmin(np.max(dist_from_all_nodes, axis=1))
+        path = [bfs[-1]]
+        while tree[path[-1]] >= 0:
+            path.append(tree[path[-1]])
+        root = path[len(path) // 2]
     bfs, tree = sp.csgraph.breadth_first_order(
         mst, directed=False, i_start=root, return_predecessors=True
     )
@@ -96,11 +148,109 @@ def _maximum_spanning_tree(
     return bfs, tree
 
 
+def _knn_maximum_spanning_tree(adj_matrix: Tensor, num_neighbors: int) -> sp.csr_matrix | None:
+    """Runs the maximum spanning tree on the sparse graph of the heaviest edges of every node.
+    Note that the result is an approximation, as the maximum spanning tree of the sparse graph
+    can be lighter than the one of the dense graph.
+
+    Args:
+        adj_matrix (Tensor): The (dense and symmetric) adjacency matrix.
+        num_neighbors (int): The number of heaviest edges kept for every node.
+
+    Returns:
+        The spanning tree as a sparse matrix, or None if the sparse graph is not connected.
+    """
+    num_nodes = adj_matrix.shape[0]
+    knn = _knn_graph(adj_matrix, num_neighbors)
+    # The maximum spanning tree is the minimum spanning tree of the negated weights, which are
+    # also shifted to be strictly negative, as zero weights are treated as missing edges
+    knn.data = (knn.data.min() - 1) - knn.data
+    mst = sp.csgraph.minimum_spanning_tree(knn)
+    if mst.nnz < num_nodes - 1:
+        return None
+    return mst
+
+
+def _knn_graph(adj_matrix: Tensor, num_neighbors: int) -> sp.csr_matrix:
+    """Builds the sparse graph of the heaviest edges of every node directly in CSR format with
+    32-bit indices. Only the selected edges are transferred to the host, and the dense adjacency
+    matrix is never copied.
+
+    Args:
+        adj_matrix (Tensor): The (dense) adjacency matrix.
+        num_neighbors (int): The number of heaviest edges kept for every node, which must be
+            less than the number of nodes.
+
+    Returns:
+        The sparse graph, having exactly num_neighbors edges from every node.
+    """
+    num_nodes = adj_matrix.shape[0]
+    # One more edge is selected for every node in place of its self-loop, and then the first
+    # num_neighbors edges that are not self-loops are kept, i.e. without masking out the main
+    # diagonal of a copy of the adjacency matrix
+    weights, neighbors = torch.topk(adj_matrix, num_neighbors + 1, dim=1)
+    is_edge = neighbors != torch.arange(num_nodes, device=neighbors.device).unsqueeze(1)
+    is_edge &= is_edge.cumsum(dim=1) <= num_neighbors
+    return sp.csr_matrix(
+        (
+            weights[is_edge].cpu().numpy(),
+            neighbors[is_edge].to(torch.int32).cpu().numpy(),
+            np.arange(0, num_nodes * num_neighbors + 1, num_neighbors, dtype=np.int32),
+        ),
+        shape=(num_nodes, num_nodes),
+    )
+
+
+def _boruvka_maximum_spanning_tree(adj: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Runs the Borůvka's algorithm on a dense adjacency matrix. Each round adds the heaviest
+    edge leaving every connected component, hence at most log(n) rounds are needed, each
+    consisting of a few vectorized O(n^2) operations.
+
+    Args:
+        adj (np.ndarray): The (dense and symmetric) adjacency matrix, which is overwritten.
+
+    Returns:
+        rows: The first endpoints of the edges of the spanning tree.
+        cols: The second endpoints of the edges of the spanning tree.
+    """
+    num_nodes = adj.shape[0]
+    nodes = np.arange(num_nodes)
+    num_components, components = num_nodes, nodes.astype(np.int32)
+    # The weights of the edges within a same component are masked out in place
+    weights = adj
+    np.fill_diagonal(weights, -np.inf)
+    rows, cols = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    while num_components > 1:
+        # The heaviest edge from every node to another component. Ties are broken by picking
+        # the edge (min(u, v), max(u, v)) that comes first in lexicographic order, so that
+        # the edges are totally ordered and no cycle can be formed. For a given node u, this
+        # is the edge to the smallest node v, i.e. the first maximum found by argmax
+        targets = np.argmax(weights, axis=1)
+        target_weights = weights[nodes, targets]
+        edge_keys = np.minimum(nodes, targets) * num_nodes + np.maximum(nodes, targets)
+        # The heaviest edge leaving every component, with ties broken as above
+        order = np.lexsort((edge_keys, -target_weights, components))
+        _, first = np.unique(components[order], return_index=True)
+        sources = order[first]
+        # Two components can select the same edge, which must be added only once
+        _, unique = np.unique(edge_keys[sources], return_index=True)
+        sources = sources[unique]
+        rows = np.concatenate([rows, sources])
+        cols = np.concatenate([cols, targets[sources]])
+        num_components, components = sp.csgraph.connected_components(
+            sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=adj.shape), directed=False
+        )
+        if num_components > 1:
+            np.putmask(weights, components[:, None] == components[None, :], -np.inf)
+    return rows, cols
+
+
 def _categorical_mutual_info(
     data: LongTensor,
     alpha: float = 0.01,
     num_categories: int | None = None,
     chunk_size: int | None = None,
+    block_size: int | None = None,
 ) -> Tensor:
     """Computes the mutual information (MI) matrix of a matrix of integers.
 
@@ -110,39 +260,124 @@ def _categorical_mutual_info(
         alpha (Tensor): Laplace smoothing factor.
         num_categories (int | None): Specifies the number of categories.
         chunk_size (int | None): Chunked computation, useful in case of large input data.
+        block_size (int | None): The number of rows of the MI matrix computed at once, useful
+            to bound the memory in case of many features or categories. If None, then the
+            rows are split in 8 blocks.
 
     Returns:
         The mutual information matrix (main diagonal is 0).
+
+    Raises:
+        ValueError: If the chunk size or the block size is not positive.
     """
     assert data.dtype == torch.long and data.ndim == 2
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"The chunk size must be positive, but found {chunk_size}")
+    if block_size is not None and block_size < 1:
+        raise ValueError(f"The block size must be positive, but found {block_size}")
     n_samples, n_features = data.size()
     if num_categories is None:
         num_categories = int(data.max().item() + 1)
     if chunk_size is None:
         chunk_size = n_samples
+    if block_size is None:
+        block_size = math.ceil(n_features / 8)
+    # On GPUs, the one-hot encoded data is multiplied in half precision, so that tensor cores
+    # can be used. The counts are still exact as long as they fit in the 11 bits of precision
+    # of halves, i.e. if each matrix multiplication is over at most 2048 samples
+    if data.is_cuda:
+        one_hot_dtype = torch.float16
+        chunk_size = min(chunk_size, 2048)
+    else:
+        one_hot_dtype = torch.float32
+    # The joint counts are accumulated in 4 bytes words whenever possible. Single precision
+    # floats are exact up to 2^24 samples, otherwise 32-bit integers (exact up to 2^31 samples)
+    # accumulate the counts of matrix multiplications over at most 2^24 samples each
+    if n_samples <= 2**24:
+        counts_dtype = torch.float32
+    else:
+        counts_dtype = torch.int32 if n_samples < 2**31 else torch.long
+        chunk_size = min(chunk_size, 2**24)
+
+    marginal_counts = torch.bincount(
+        (data + num_categories * torch.arange(n_features, device=data.device)).flatten(),
+        minlength=n_features * num_categories,
+    ).view(n_features, num_categories)
+    marginals = (marginal_counts.to(torch.float32) + num_categories * alpha) / (
+        n_samples + num_categories**2 * alpha
+    )
+    # The smoothed joints marginalize to the smoothed marginals, hence the MI can be computed as
+    # I(X_i, X_j) = H(X_i) + H(X_j) - H(X_i, X_j), i.e. with no outer products of the marginals
+    entropies = -(marginals * marginals.log()).sum(dim=1)
+
+    # The MI matrix is computed by blocks of rows, so that only the (B, F, K, K) joints of
+    # a block of B features are kept in memory at any time. Since the MI matrix is symmetric,
+    # each block only computes the columns from its first feature onwards, i.e. the upper
+    # triangle. Note that the joints on the main diagonal need no correction of the Laplace's
+    # smoothing, as the diagonal is discarded
+    mutual_info = torch.zeros(n_features, n_features, dtype=torch.float32, device=data.device)
+    for block_start in range(0, n_features, block_size):
+        block = slice(block_start, block_start + block_size)
+        # The joint counts are the entries of the Gram matrix of the one-hot encoded data,
+        # i.e. a (B * K) x N @ N x ((F - b) * K) matrix multiplication
+        joint_counts = torch.zeros(
+            min(block_size, n_features - block_start) * num_categories,
+            (n_features - block_start) * num_categories,
+            dtype=counts_dtype,
+            device=data.device,
+        )
+        # The one-hot encodings are written directly in a buffer that is reused across chunks,
+        # which avoids materializing a (chunk_size, F - b, K) integer tensor per chunk
+        one_hot_buffer = torch.empty(
+            min(chunk_size, n_samples),
+            (n_features - block_start) * num_categories,
+            dtype=one_hot_dtype,
+            device=data.device,
+        )
+        category_offsets = num_categories * torch.arange(
+            n_features - block_start, device=data.device
+        )
+        for chunk in data.split(chunk_size):
+            one_hot = one_hot_buffer[: len(chunk)].zero_()
+            one_hot.scatter_(1, chunk[:, block_start:] + category_offsets, 1.0)
+            block_one_hot = one_hot[:, : block_size * num_categories].t()
+            if one_hot_dtype == counts_dtype:
+                joint_counts.addmm_(block_one_hot, one_hot)
+            else:
+                joint_counts += torch.mm(block_one_hot, one_hot).to(counts_dtype)
+        # The joints are computed in place of the counts, and all the values are kept in single
+        # precision, as the smoothing keeps the probabilities far away from zero. Moreover, the
+        # joints are kept in the (B, K, F - b, K) layout given by the matrix multiplication
+        joints = joint_counts.to(torch.float32)
+        joints.add_(alpha).div_(n_samples + num_categories**2 * alpha)
+        joints = joints.view(-1, num_categories, n_features - block_start, num_categories)
+
+        joint_entropies = -joints.log().mul_(joints).sum(dim=(1, 3))
+        mutual_info[block, block_start:] = (
+            entropies[block].unsqueeze(1) + entropies[block_start:] - joint_entropies
+        )
+    mutual_info = mutual_info.triu(diagonal=1)
+    return mutual_info + mutual_info.t()
 
-    idx_features = torch.arange(0, n_features)
-    idx_categories = torch.arange(0, num_categories)
 
-    joint_counts = torch.zeros(
-        n_features, n_features, num_categories**2, dtype=torch.long, device=data.device
-    )
-    for chunk in data.split(chunk_size):
-        joint_values = chunk.t().unsqueeze(1) * num_categories + chunk.t().unsqueeze(0)
-        joint_counts.scatter_add_(-1, joint_values.long(), torch.ones_like(joint_values))
-    joint_counts = joint_counts.view(n_features, n_features, num_categories, num_categories)
-    marginal_counts = joint_counts[idx_features, idx_features][:, idx_categories, idx_categories]
+def _gaussian_mutual_info(data: Tensor) -> Tensor:
+    """Computes the mutual information (MI) matrix of a matrix of real values, as if they were
+    distributed as a Multivariate Gaussian, i.e. I(X, Y) = -0.5 * log(1 - rho(X, Y)^2) where rho
+    is the Pearson's correlation coefficient.
 
-    marginals = (marginal_counts + num_categories * alpha) / (
-        n_samples + num_categories**2 * alpha
-    )
-    joints = (joint_counts + alpha) / (n_samples + num_categories**2 * alpha)
-    joints[idx_features, idx_features] = torch.diag_embed(
-        marginals
-    )  # Correct Laplace's smoothing for the marginals
-    outers = torch.einsum("ik,jl->ijkl", marginals, marginals)
+    Args:
+        data (Tensor): The input data over which computing the MI matrix,
+            it must be in tabular form (i.e. a matrix).
 
-    return (joints * (joints.log() - outers.log())).sum(dim=(2, 3)).fill_diagonal_(0)
+    Returns:
+        The mutual information matrix (main diagonal is 0).
+    """
+    # The correlation matrix is computed with a single matrix multiplication of the standardized
+    # data, and log1p is more accurate for the many small correlations
+    data = data - data.mean(dim=0)
+    data = data / torch.std(data, dim=0, unbiased=False)
+    corr = (data.t() @ data / data.shape[0]).clamp_(-1.0, 1.0)
+    return (-0.5 * torch.log1p(-corr.square())).fill_diagonal_(0)
 
 
 def _heterogeneous_mutual_info(
@@ -169,73 +404,88 @@ def _heterogeneous_mutual_info(
 
     GAUSSIAN_ENTROPY_EPSILON = 1e-4
 
+    # The mutual information is computed in a floating point type, even for integer data
+    data = data.to(torch.promote_types(data.dtype, torch.float32))
+
     is_categorical = torch.tensor(is_categorical_mask, dtype=torch.bool, device=data.device)
     continuous_subset = torch.where(~is_categorical)[0]
     discrete_subset = torch.where(is_categorical)[0]
 
-    mi_matrix = torch.zeros((data.shape[1], data.shape[1]), dtype=torch.float32, device=data.device)
+    mi_matrix = torch.zeros((data.shape[1], data.shape[1]), dtype=data.dtype, device=data.device)
 
     # Compute mutual information for continuous variables as they were a Multivariate Gaussian
     if len(continuous_subset) > 1:
-        mi_matrix[continuous_subset.unsqueeze(1), continuous_subset] = -0.5 * torch.log(
-            1 - torch.corrcoef(data[:, continuous_subset].t()).fill_diagonal_(0) ** 2
+        mi_matrix[continuous_subset.unsqueeze(1), continuous_subset] = _gaussian_mutual_info(
+            data[:, continuous_subset]
         )
 
+    # Precomputing number of categories for discrete variables, with a single reduction
+    # and a single device to host transfer for all of them
+    num_categories = dict(
+        zip(
+            discrete_subset.tolist(),
+            (data[:, discrete_subset].amax(dim=0).long() + 1).tolist(),
+        )
+    )
+
     # Compute mutual information for discrete variables
     if len(discrete_subset) > 1:
         mi_matrix[discrete_subset.unsqueeze(1), discrete_subset] = _categorical_mutual_info(
-            data=data[:, discrete_subset].long(), num_categories=None, chunk_size=None
-        )
-
-    def gaussian_entropy(x: Tensor) -> Tensor:
-        return 0.5 * (
-            torch.log(2 * torch.pi * torch.var(x, unbiased=False) + GAUSSIAN_ENTROPY_EPSILON) + 1
-        )
-
-    # Precomputing number of categories for discrete variables
-    num_categories = {
-        d_index: int(data[:, d_index].max() + 1) for d_index in discrete_subset.tolist()
-    }
-
-    # Precomputing marginals p(D) for every discrete variable
-    p_D = {
-        d_index: data[:, d_index].long().bincount(minlength=num_categories[d_index]).float()
-        / data.shape[0]
-        for d_index in discrete_subset.tolist()
-    }
-
-    # precomputing gaussian entropy H(C) for each continuous variable
-    h_C = {c_index: gaussian_entropy(data[:, c_index]) for c_index in continuous_subset.tolist()}
+            data=data[:, discrete_subset].long(),
+            num_categories=max(num_categories.values()),
+            chunk_size=None,
+        ).to(mi_matrix.dtype)
+
+    # Precomputing marginals p(D) for every discrete variable with a single segmented count,
+    # i.e. a (F_d, K) matrix where variables with less than K categories are padded with zeros
+    num_discrete, num_continuous = len(discrete_subset), len(continuous_subset)
+    max_num_categories = max(num_categories.values(), default=0)
+    num_groups = num_discrete * max_num_categories
+    discrete_data = data[:, discrete_subset].long()
+    group_ids = discrete_data + max_num_categories * torch.arange(num_discrete, device=data.device)
+    counts = torch.bincount(group_ids.flatten(), minlength=num_groups).to(data.dtype)
+    p_D = counts.view(num_discrete, max_num_categories) / data.shape[0]
+
+    # Precomputing gaussian entropies H(C) for every continuous variable with a single reduction
+    h_C = data.new_empty(0)
+    if num_continuous > 0:
+        var_C = data[:, continuous_subset].var(dim=0, unbiased=False)
+        h_C = 0.5 * (torch.log(2 * torch.pi * var_C + GAUSSIAN_ENTROPY_EPSILON) + 1)
 
     # I(C, D) = H(C) - H(C | D)
-    for c_index in continuous_subset.tolist():
-        for d_index in discrete_subset.tolist():
-            # H(C | D) = sum_D{ integral_C{ p(C|D)p(D) log_p(C|D) } } = sum_D{ -H[p(C|D)]p(D) }
-
-            # Computing H[p(C|D)] for each category of D
-            h_C_given_D = torch.stack(
-                [
-                    gaussian_entropy(data[:, c_index][data[:, d_index] == i])
-                    for i in range(num_categories[d_index])
-                ],
-                dim=0,
-            )
-
-            # I(C, D) = H(C) - H(C | D) = H(C) - sum_D{ H[p(C|D)]p(D) }
-            mi_matrix[c_index, d_index] = h_C[c_index] - torch.sum(h_C_given_D * p_D[d_index])
-            mi_matrix[d_index, c_index] = mi_matrix[
-                c_index, d_index
-            ]  # mutual information is symmetric
+    if len(continuous_subset) > 0 and len(discrete_subset) > 0:
+        # H(C | D) = sum_D{ integral_C{ p(C|D)p(D) log_p(C|D) } } = sum_D{ -H[p(C|D)]p(D) }
+
+        # Precompute the masks of every category of every discrete variable as a one-hot
+        # encoding, so that the per-category sums needed by the variances of p(C|D) are
+        # computed for all the (C, D) pairs at once by two matrix multiplications
+        masks = torch.nn.functional.one_hot(discrete_data, max_num_categories)
+        masks = masks.view(-1, num_groups).to(data.dtype)
+        # Centering does not change the variances, but it avoids cancellations below
+        x = data[:, continuous_subset]
+        x = x - x.mean(dim=0)
+        sum_x = x.t() @ masks
+        sum_x2 = x.square().t() @ masks
+
+        # Computing H[p(C|D)] for each category of D, where empty categories get
+        # a zero variance and are then weighted by p(D) = 0
+        group_counts = counts.clamp(min=1)
+        mean_x = sum_x / group_counts
+        var_x = (sum_x2 / group_counts - mean_x**2).clamp(min=0)
+        h_C_given_D = 0.5 * (torch.log(2 * torch.pi * var_x + GAUSSIAN_ENTROPY_EPSILON) + 1)
+
+        # I(C, D) = H(C) - H(C | D) = H(C) - sum_D{ H[p(C|D)]p(D) }
+        mi_cd = h_C.unsqueeze(1) - (
+            h_C_given_D.view(num_continuous, num_discrete, max_num_categories) * p_D
+        ).sum(dim=-1)
+        mi_matrix[continuous_subset.unsqueeze(1), discrete_subset] = mi_cd
+        mi_matrix[discrete_subset.unsqueeze(1), continuous_subset] = mi_cd.t()
 
     if normalize:
         # NMI(X, Y) = 2 * I(X, Y) / (H(X) + H(Y))
-        entropy = torch.zeros(data.shape[1], dtype=torch.float32, device=data.device)
-        entropy[continuous_subset] = torch.tensor(
-            list(h_C.values()), dtype=torch.float32, device=data.device
-        )
-        entropy[discrete_subset] = torch.tensor(
-            [-(p.log() * p).sum() for p in p_D.values()], dtype=torch.float32, device=data.device
-        )
+        entropy = torch.zeros(data.shape[1], dtype=data.dtype, device=data.device)
+        entropy[continuous_subset] = h_C
+        entropy[discrete_subset] = -torch.xlogy(p_D, p_D).sum(dim=1)
         mi_matrix = 2 * mi_matrix / (entropy.unsqueeze(0) + entropy.unsqueeze(1))
 
     return mi_matrix.fill_diagonal_(0)
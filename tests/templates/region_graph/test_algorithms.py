@@ -2,8 +2,10 @@ import itertools
 
 import numpy as np
 import pytest
+import torch
 
 from cirkit.templates.region_graph import (
+    ChowLiuTree,
     FullyFactorized,
     LinearTree,
     PoonDomingos,
@@ -12,6 +14,11 @@ from cirkit.templates.region_graph import (
     RandomBinaryTree,
     RegionNode,
 )
+from cirkit.templates.region_graph.algorithms.chow_liu import (
+    _categorical_mutual_info,
+    _heterogeneous_mutual_info,
+    _knn_graph,
+)
 from cirkit.utils.scope import Scope
 from tests.templates.region_graph.test_utils import check_region_graph_save_load
 
@@ -144,3 +151,228 @@ def test_rg_algorithm_poon_domingos(
         assert not rg.is_structured_decomposable
     # TODO: how to test the PoonDomingos region graph?
     check_region_graph_save_load(rg)
+
+
+@pytest.mark.parametrize(
+    "input_type,root,chunk_size,block_size,num_neighbors",
+    [
+        (input_type, root, *sizes)
+        for input_type, root, sizes in itertools.product(
+            ["categorical", "gaussian", "heterogeneous"],
+            [None, 0, 4],
+            [(None, None, None), (64, 4, 2)],
+        )
+    ],
+)
+def test_rg_algorithm_chow_liu_tree(
+    input_type: str,
+    root: int | None,
+    chunk_size: int | None,
+    block_size: int | None,
+    num_neighbors: int | None,
+):
+    num_samples, num_variables = 1000, 6
+    generator = torch.Generator().manual_seed(42)
+    # Sample a Markov chain X_0 -> X_1 -> ... -> X_5, whose Chow-Liu tree is the chain itself
+    data = torch.empty(num_samples, num_variables)
+    data[:, 0] = torch.randn(num_samples, generator=generator)
+    for i in range(1, num_variables):
+        data[:, i] = data[:, i - 1] + 0.5 * torch.randn(num_samples, generator=generator)
+        if input_type == "heterogeneous" and i % 3 == 2:
+            data[:, i] = (data[:, i] > 0.5).to(data.dtype)
+    input_types: str | list[str] = input_type
+    if input_type == "categorical":
+        data = (data > 0).long()
+    elif input_type == "heterogeneous":
+        input_types = ["gaussian", "gaussian", "categorical"] * (num_variables // 3)
+    tree = ChowLiuTree(
+        data,
+        input_types,
+        root=root,
+        chunk_size=chunk_size,
+        block_size=block_size,
+        num_neighbors=num_neighbors,
+        as_region_graph=False,
+    )
+    assert tree.shape == (num_variables,)
+    # The chain has two central variables, i.e., the ones minimizing the depth of the tree
+    assert np.flatnonzero(tree == -1).tolist() in ([[2], [3]] if root is None else [[root]])
+    edges = {frozenset((i, int(p))) for i, p in enumerate(tree) if p != -1}
+    assert edges == {frozenset((i, i + 1)) for i in range(num_variables - 1)}
+    rg = ChowLiuTree(data, input_types, root=root, chunk_size=chunk_size, block_size=block_size)
+    (rg_root,) = list(rg.outputs)
+    assert rg_root.scope == Scope(range(num_variables))
+
+
+@pytest.mark.parametrize("input_type", ["categorical", "heterogeneous"])
+def test_rg_algorithm_chow_liu_tree_integer_data(input_type: str):
+    num_samples, num_variables = 1000, 5
+    generator = torch.Generator().manual_seed(42)
+    # Sample a Markov chain of integers, where each variable copies the previous one w.p. 0.8
+    data = torch.empty(num_samples, num_variables, dtype=torch.long)
+    data[:, 0] = torch.randint(3, (num_samples,), generator=generator)
+    for i in range(1, num_variables):
+        noise = torch.randint(3, (num_samples,), generator=generator)
+        copy = torch.rand(num_samples, generator=generator) < 0.8
+        data[:, i] = torch.where(copy, data[:, i - 1], noise)
+    input_types = ["categorical"] * num_variables
+    if input_type == "heterogeneous":
+        input_types[0] = "gaussian"
+    tree = ChowLiuTree(data, input_types, root=0, as_region_graph=False)
+    edges = {frozenset((i, int(p))) for i, p in enumerate(tree) if p != -1}
+    assert edges == {frozenset((i, i + 1)) for i in range(num_variables - 1)}
+
+
+def test_rg_algorithm_chow_liu_tree_disconnected_neighbors():
+    num_samples, chain_length = 1000, 4
+    generator = torch.Generator().manual_seed(42)
+    # Sample two independent Markov chains, so that the graph of the two heaviest edges of every
+    # variable is not connected, and the spanning tree is searched within the dense graph
+    data = torch.empty(num_samples, 2 * chain_length)
+    for start in [0, chain_length]:
+        data[:, start] = torch.randn(num_samples, generator=generator)
+        for i in range(start + 1, start + chain_length):
+            data[:, i] = data[:, i - 1] + 0.5 * torch.randn(num_samples, generator=generator)
+    tree = ChowLiuTree(data, "gaussian", root=0, num_neighbors=2, as_region_graph=False)
+    edges = {frozenset((i, int(p))) for i, p in enumerate(tree) if p != -1}
+    assert np.flatnonzero(tree == -1).tolist() == [0]
+    assert len(edges) == 2 * chain_length - 1
+    assert {
+        frozenset((i, i + 1))
+        for start in [0, chain_length]
+        for i in range(start, start + chain_length - 1)
+    } <= edges
+
+
+@pytest.mark.parametrize("num_neighbors", [1, 2, 5])
+def test_knn_graph(num_neighbors: int):
+    num_nodes = 12
+    generator = torch.Generator().manual_seed(42)
+    # A symmetric adjacency matrix with a zero main diagonal, as the mutual information matrices
+    adj_matrix = torch.rand(num_nodes, num_nodes, generator=generator)
+    adj_matrix = (adj_matrix + adj_matrix.t()).fill_diagonal_(0.0)
+    knn = _knn_graph(adj_matrix, num_neighbors)
+    assert knn.nnz == num_nodes * num_neighbors
+    assert knn.indices.dtype == np.int32 and knn.indptr.dtype == np.int32
+    assert (knn.diagonal() == 0.0).all()
+    for i in range(num_nodes):
+        row = knn.getrow(i)
+        expected_weights, _ = adj_matrix[i].sort(descending=True)
+        assert row.nnz == num_neighbors
+        assert np.allclose(np.sort(row.data)[::-1], expected_weights[:num_neighbors].numpy())
+        assert np.allclose(row.data, adj_matrix[i, row.indices].numpy())
+
+
+@pytest.mark.parametrize("num_neighbors", [0, -1])
+def test_rg_algorithm_chow_liu_tree_invalid_neighbors(num_neighbors: int):
+    data = torch.randn(100, 6)
+    with pytest.raises(ValueError):
+        ChowLiuTree(data, "gaussian", num_neighbors=num_neighbors)
+
+
+@pytest.mark.parametrize(
+    "num_categories,num_bins,max_category,binned",
+    [
+        (64, None, 63, True),
+        (None, None, 63, True),
+        (None, None, 62, True),
+        (64, 8, 63, True),
+        (64, 64, 63, False),
+    ],
+)
+def test_rg_algorithm_chow_liu_tree_bins(
+    num_categories: int | None, num_bins: int | None, max_category: int, binned: bool
+):
+    num_samples = 2000
+    generator = torch.Generator().manual_seed(42)
+
+    def noisy_copy(x: torch.Tensor, p: float) -> torch.Tensor:
+        noise = torch.randint(8, (num_samples,), generator=generator)
+        return torch.where(torch.rand(num_samples, generator=generator) < p, x, noise)
+
+    # Each of the 64 categories is given by a high (bin) and a low digit in base 8. The high
+    # digits of X_1 and X_2 are noisy copies of the one of X_0, while X_1 and X_2 share the
+    # low digit. Hence, X_1 and X_2 are dependent only if the categories are not in bins. The
+    # last category can be merged into the previous one, so that the inferred number of
+    # categories is not a multiple of the number of bins
+    high = torch.randint(8, (num_samples,), generator=generator)
+    low = torch.randint(8, (num_samples, 2), generator=generator)
+    data = torch.stack(
+        [
+            high * 8 + low[:, 0],
+            noisy_copy(high, 0.9) * 8 + low[:, 1],
+            noisy_copy(high, 0.6) * 8 + low[:, 1],
+        ],
+        dim=1,
+    ).clamp(max=max_category)
+    tree = ChowLiuTree(
+        data,
+        "categorical",
+        root=0,
+        num_categories=num_categories,
+        num_bins=num_bins,
+        as_region_graph=False,
+    )
+    assert tree.tolist() == ([-1, 0, 0] if binned else [-1, 0, 1])
+
+
+@pytest.mark.parametrize(
+    "chunk_size,block_size", [(None, None), (None, 1), (97, 3), (250, 4), (1000, 7)]
+)
+def test_categorical_mutual_info(chunk_size: int | None, block_size: int | None):
+    num_samples, num_variables, num_categories, alpha = 1000, 7, 5, 0.01
+    generator = torch.Generator().manual_seed(42)
+    data = torch.randint(num_categories, (num_samples, num_variables), generator=generator)
+    # Make the variables dependent, so that the mutual information is not close to zero
+    data[:, 1:] = torch.where(data[:, 1:] < 2, data[:, :-1], data[:, 1:])
+    mutual_info = _categorical_mutual_info(
+        data,
+        alpha=alpha,
+        num_categories=num_categories,
+        chunk_size=chunk_size,
+        block_size=block_size,
+    )
+    # Compute the mutual information with the Laplace's smoothed joints and marginals
+    expected_mutual_info = torch.zeros(num_variables, num_variables)
+    normalizer = num_samples + num_categories**2 * alpha
+    for i, j in itertools.permutations(range(num_variables), 2):
+        joint_counts = torch.zeros(num_categories, num_categories)
+        joint_counts.index_put_((data[:, i], data[:, j]), torch.ones(num_samples), accumulate=True)
+        joints = (joint_counts + alpha) / normalizer
+        marginals_i = (joint_counts.sum(dim=1) + num_categories * alpha) / normalizer
+        marginals_j = (joint_counts.sum(dim=0) + num_categories * alpha) / normalizer
+        expected_mutual_info[i, j] = (
+            joints * (joints.log() - torch.outer(marginals_i, marginals_j).log())
+        ).sum()
+    assert mutual_info.shape == (num_variables, num_variables)
+    assert torch.allclose(
+        mutual_info.to(expected_mutual_info.dtype), expected_mutual_info, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("chunk_size,block_size", [(0, None), (None, 0), (-1, None), (None, -2)])
+def test_categorical_mutual_info_invalid_sizes(chunk_size: int | None, block_size: int | None):
+    data = torch.randint(3, (10, 4))
+    with pytest.raises(ValueError):
+        _categorical_mutual_info(data, chunk_size=chunk_size, block_size=block_size)
+
+
+def test_heterogeneous_mutual_info_unobserved_categories():
+    num_samples = 1000
+    generator = torch.Generator().manual_seed(42)
+    # The discrete variables take values in {0, 2} and {0, 1, 3}, i.e., some categories
+    # are never observed, whose probabilities are zero
+    x = torch.randn(num_samples, generator=generator)
+    data = torch.stack(
+        [
+            x,
+            2.0 * (x > 0),
+            x + torch.randn(num_samples, generator=generator),
+            (x > -0.5).to(x.dtype) + 2.0 * (x > 0.5),
+        ],
+        dim=1,
+    )
+    mutual_info = _heterogeneous_mutual_info(data, is_categorical_mask=[False, True, False, True])
+    assert torch.isfinite(mutual_info).all()
+    assert (mutual_info.diagonal() == 0.0).all()
+    assert (mutual_info[~torch.eye(4, dtype=torch.bool)] > 0.0).all()